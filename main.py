@@ -1,22 +1,153 @@
+import math
 import os
-import fitz
-import gc
-import img2pdf
-from PIL import Image, ImageOps, ImageFilter, ImageEnhance
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from io import BytesIO
-from PyPDF2 import PdfWriter, PdfMerger, PdfReader
-from pdf2image import convert_from_path
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from tqdm import tqdm
+from itertools import chain, islice
+
+# Third-party modules are imported inside the functions that use them, so each menu
+# option only pays the import cost (PyMuPDF, Pillow, ReportLab, ...) of what it runs.
 
 # ---------- Enhanced PDF Functions ----------
+@lru_cache(maxsize=256)
+def _invert_contrast_lut(contrast, mean):
+    """Invert + contrast fused into one RGB lookup table (mean = grey level of the inverted image)"""
+    table = []
+    for value in range(256):
+        # Same math as ImageEnhance.Contrast: blend the inverted value away from the mean
+        out = int(mean + contrast * ((255 - value) - mean))
+        table.append(min(255, max(0, out)))
+    return table * 3
+
+@lru_cache(maxsize=None)
+def _load_fused_filter():
+    """JIT-compile the fused filter on first use
+
+    Returns (kernel, box_weights), or None when numpy/numba aren't installed.
+    """
+    try:
+        import numpy as np
+        import numba
+    except ImportError:  # Optional accelerator; Pillow's filters are used without it
+        return None
+    prange = numba.prange
+
+    # Pillow's BoxBlur.c pass in 8.24 fixed point: ww for the 2*radius+1 inner samples, fw for
+    # the two beyond them. Whole rows at a time, so every inner loop is a contiguous, SIMD-able run
+    @numba.njit(cache=True)
+    def box_shifts(padded, stride, out, radius, ww, fw):
+        """Horizontal pass over a row padded with (radius+1)*stride repeated edge samples"""
+        acc = np.zeros(out.shape[0], np.uint32)
+        for t in range(1, 2 * radius + 2):
+            row = padded[t * stride:t * stride + out.shape[0]]
+            for j in range(acc.shape[0]):
+                acc[j] += row[j]
+        lo = padded[:out.shape[0]]
+        hi = padded[(2 * radius + 2) * stride:(2 * radius + 2) * stride + out.shape[0]]
+        for j in range(acc.shape[0]):
+            out[j] = (acc[j] * ww + (np.uint32(lo[j]) + hi[j]) * fw + (1 << 23)) >> 24
+
+    @numba.njit(cache=True)
+    def box_rows(src, y, out, radius, ww, fw):
+        """Vertical pass for output row y, rows past the top/bottom repeating the edge row"""
+        last = src.shape[0] - 1
+        acc = np.zeros(out.shape[0], np.uint32)
+        for k in range(y - radius, y + radius + 1):
+            row = src[min(max(k, 0), last)]
+            for j in range(acc.shape[0]):
+                acc[j] += row[j]
+        lo = src[max(y - radius - 1, 0)]
+        hi = src[min(y + radius + 1, last)]
+        for j in range(acc.shape[0]):
+            out[j] = (acc[j] * ww + (np.uint32(lo[j]) + hi[j]) * fw + (1 << 23)) >> 24
+
+    def kernel(src, lut, radius, ww, fw, percent, threshold, out):
+        """Invert+contrast via lut, then ImageFilter.UnsharpMask's exact arithmetic, rows in parallel"""
+        height, width, channels = src.shape
+        row_len = width * channels
+        pad = (radius + 1) * channels
+        flat_src = src.reshape(height, row_len)
+        flat_out = out.reshape(height, row_len)
+        first = np.empty((height, row_len), np.uint8)
+        second = np.empty((height, row_len), np.uint8)
+        ww = np.uint32(ww)
+        fw = np.uint32(fw)
+
+        # lut, then three horizontal passes, each row in place in first
+        for y in prange(height):
+            line = first[y]
+            for i in range(row_len):
+                line[i] = lut[flat_src[y, i]]
+            padded = np.empty(row_len + 2 * pad, np.uint8)
+            for _ in range(3):
+                padded[pad:pad + row_len] = line
+                for i in range(pad):
+                    padded[i] = line[i % channels]
+                    padded[pad + row_len + i] = line[row_len - channels + i % channels]
+                box_shifts(padded, channels, line, radius, ww, fw)
+
+        # Three vertical passes, ping-ponging so the result ends up in second
+        for rows, blurred in ((first, second), (second, first), (first, second)):
+            for y in prange(height):
+                box_rows(rows, y, blurred[y], radius, ww, fw)
+
+        for y in prange(height):
+            for i in range(row_len):
+                value = lut[flat_src[y, i]]
+                diff = value - np.int32(second[y, i])
+                if abs(diff) > threshold:
+                    # C division truncates towards zero, unlike //
+                    delta = abs(diff) * percent // 100
+                    value += delta if diff > 0 else -delta
+                flat_out[y, i] = min(255, max(0, value))
+
+    @lru_cache(maxsize=4)
+    def box_weights(radius):
+        """(radius, ww, fw) of the three box passes Pillow uses for a Gaussian blur, in its float32 math"""
+        f32 = np.float32
+        sigma2 = f32(radius) * f32(radius) / f32(3)
+        box_len = f32(math.sqrt(12.0 * float(sigma2) + 1.0))
+        whole = f32(math.floor((float(box_len) - 1.0) / 2.0))
+        frac = (2 * whole + 1) * (whole * (whole + 1) - 3 * sigma2)
+        frac /= 6 * (sigma2 - (whole + 1) * (whole + 1))
+        box_radius = f32(whole + frac)
+        ww = int(f32(1 << 24) / (box_radius * 2 + 1))
+        fw = ((1 << 24) - (int(box_radius) * 2 + 1) * ww) // 2
+        return int(box_radius), ww, fw
+
+    return numba.njit(parallel=True, cache=True)(kernel), box_weights
+
+def _fused_filter(pixels, lut, radius, percent, threshold):
+    """Run the numba kernel over a PIL image or an (h, w, 3) uint8 array (read in place)"""
+    import numpy as np
+    from PIL import Image
+
+    kernel, box_weights = _load_fused_filter()
+    src = np.asarray(pixels)
+    out = np.empty_like(src)
+    kernel(src, np.asarray(lut[:256], dtype=np.int32), *box_weights(radius), percent, threshold, out)
+    return Image.fromarray(out)
+
+def _contrast_lut(channel_means, contrast):
+    """Invert+contrast lookup table for an RGB frame with the given per-channel means"""
+    r, g, b = channel_means
+    # Grey level of the inverted frame, with the ITU-R 601-2 weights convert("L") uses
+    mean = 255 - int(r * 0.299 + g * 0.587 + b * 0.114 + 0.5)
+    return _invert_contrast_lut(contrast, mean)
+
 def process_image(img, contrast=2.0, sharpness=200):
     """Simple pipeline: Invert colors → Boost contrast → Sharpen"""
+    from PIL import ImageFilter, ImageStat
+
     try:
-        inverted = ImageOps.invert(img.convert("RGB"))
-        enhancer = ImageEnhance.Contrast(inverted)
-        contrasted = enhancer.enhance(contrast)
+        # fitz pixmaps are already RGB; skip the full-frame copy convert() makes
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        lut = _contrast_lut(ImageStat.Stat(img).mean, contrast)
+        if _load_fused_filter() is not None:
+            return _fused_filter(img, lut, radius=1.5, percent=sharpness, threshold=2)
+        contrasted = img.point(lut)
         sharpened = contrasted.filter(ImageFilter.UnsharpMask(
             radius=1.5, 
             percent=sharpness, 
@@ -26,461 +157,303 @@ def process_image(img, contrast=2.0, sharpness=200):
     except Exception as e:
         print(f"Image error: {str(e)}")
         return None
-    finally:
-        gc.collect()
-
-def enhance_pdf(input_path, output_path, dpi=300):
-    """PDF processing with minimal filters"""
-    doc = fitz.open(input_path)
-    writer = PdfWriter()
-    
-    for page_num in range(len(doc)):
-        try:
-            pix = doc[page_num].get_pixmap(dpi=dpi)
-            img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
-            processed = process_image(img)
-            if not processed:
-                continue
-                
-            with BytesIO() as buffer:
-                processed.save(buffer, format="PNG", dpi=(dpi, dpi))
-                pdf_bytes = img2pdf.convert(
-                    buffer.getvalue(),
-                    layout_fun=img2pdf.get_fixed_dpi_layout_fun((dpi, dpi)),
-                    width=img2pdf.mm_to_pt(processed.width/dpi*25.4),
-                    height=img2pdf.mm_to_pt(processed.height/dpi*25.4)
-                )
-                writer.append(BytesIO(pdf_bytes))
-        except Exception as e:
-            print(f"Page {page_num+1} error: {str(e)}")
-            continue
-        finally:
-            if 'pix' in locals(): del pix
-            if 'img' in locals(): del img
-            if 'processed' in locals(): del processed
-            if page_num % 10 == 0:
-                gc.collect()
-    
-    with open(output_path, "wb") as f:
-        writer.write(f)
-    doc.close()
-
-# ---------- Merge Slides Functions ----------
-def process_slides_to_pdf(slides, output_path, dpi=300):
-    A4_WIDTH, A4_HEIGHT = 2480, 3508  # 8.27" x 11.69" @300DPI
-    SLIDES_PER_PAGE = 3
-    output_pages = []
-
-    for i in range(0, len(slides), SLIDES_PER_PAGE):
-        page = Image.new('RGB', (A4_WIDTH, A4_HEIGHT), (255, 255, 255))
-        y_cursor = 0
-        
-        for slide in slides[i:i+SLIDES_PER_PAGE]:
-            if slide.mode == 'RGBA':
-                slide = slide.convert('RGB')
-            
-            orig_width, orig_height = slide.size
-            target_height = A4_HEIGHT // SLIDES_PER_PAGE
-            
-            scale_factor = target_height / orig_height
-            scaled_width = int(orig_width * scale_factor)
-            
-            if scaled_width > A4_WIDTH:
-                scale_factor = A4_WIDTH / orig_width
-                scaled_width = A4_WIDTH
-                target_height = int(orig_height * scale_factor)
-            
-            resized = slide.resize((scaled_width, target_height), Image.LANCZOS)
-            x_pos = (A4_WIDTH - scaled_width) // 2
-            page.paste(resized, (x_pos, y_cursor))
-            y_cursor += target_height
-        
-        output_pages.append(page)
-
-    with open(output_path, "wb") as f:
-        images_bytes = []
-        for img in output_pages:
-            img_byte_arr = BytesIO()
-            img.save(img_byte_arr, format='JPEG', quality=95, dpi=(dpi, dpi))
-            images_bytes.append(img_byte_arr.getvalue())
-        
-        pdf_bytes = img2pdf.convert(images_bytes, layout_fun=img2pdf.get_layout_fun(
-            (img2pdf.in_to_pt(8.27), img2pdf.in_to_pt(11.69))
-        ))
-        f.write(pdf_bytes)
-
-# ---------- Page Number Functions ----------
-def get_page_number_position(position, page_width, page_height):
-    positions = {
-        "bottom left": (10, 10),
-        "bottom right": (page_width - 30, 10),
-        "top left": (10, page_height - 20),
-        "top right": (page_width - 30, page_height - 20),
-        "top middle": (page_width / 2 - 10, page_height - 20),
-        "bottom middle": (page_width / 2 - 10, 10)
-    }
-    return positions.get(position, (10, 10))
-
-def create_page_number_pdf(page_num, position, page_width, page_height):
-    packet = BytesIO()
-    can = canvas.Canvas(packet, pagesize=(page_width, page_height))
-    x, y = get_page_number_position(position, page_width, page_height)
-    can.setFont("Helvetica", 12)
-    can.drawString(x, y, str(page_num))
-    can.save()
-    packet.seek(0)
-    return packet
-
-def add_page_numbers(input_pdf_path, output_pdf_path, position, start_page=1):
-    reader = PdfReader(input_pdf_path)
-    writer = PdfWriter()
 
-    for i in range(len(reader.pages)):
-        page = reader.pages[i]
-        page_width = float(page.mediabox[2])
-        page_height = float(page.mediabox[3])
-        
-        temp_pdf = create_page_number_pdf(start_page + i, position, page_width, page_height)
-        page_number_reader = PdfReader(temp_pdf)
-        page.merge_page(page_number_reader.pages[0])
-        writer.add_page(page)
-
-    with open(output_pdf_path, "wb") as f:
-        writer.write(f)
-
-# ---------- Main Workflow ----------
-def get_poppler_path():
-    """Helper function to get Poppler path from user"""
-    return input("Enter path to Poppler's bin directory (e.g., C:\\poppler\\Library\\bin): ").strip()
-
-def main():
-    print("=== PDF Processing Tool ===")
-    print("Choose an operation:")
-    print("1. Full Workflow: Enhance PDFs → Merge Slides → Add Page Numbers")
-    print("2. Enhance PDFs only")
-    print("3. Merge PDF pages into 3 slides per A4 page")
-    print("4. Add page numbers to a PDF")
-    print("5. Convert images to PDF with page numbers")
-    choice = input("Enter your choice (1-5): ").strip()
-
-    if choice == '1':
-        input_folder = input("Enter path to folder containing PDFs: ").strip()
-        output_dir = input("Enter output directory path: ").strip()
-        base_name = input("Enter base name for output file (without extension): ").strip()
-        position = input("Page number position (bottom left, bottom right, top left, top right, top middle, bottom middle): ").strip().lower()
-        start_page = int(input("Starting page number: ").strip())
-        poppler_path = get_poppler_path()
-
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Step 1: Enhance all PDFs
-        temp_enhanced_dir = os.path.join(output_dir, "temp_enhanced_pdfs")
-        os.makedirs(temp_enhanced_dir, exist_ok=True)
-
-        pdf_files = sorted([f for f in os.listdir(input_folder) if f.lower().endswith('.pdf')])
-        if not pdf_files:
-            print("No PDF files found in the input folder.")
-            return
-
-        print("\nEnhancing PDFs...")
-        for pdf_file in tqdm(pdf_files, desc="Processing PDFs"):
-            input_path = os.path.join(input_folder, pdf_file)
-            output_path = os.path.join(temp_enhanced_dir, f"enhanced_{pdf_file}")
-            enhance_pdf(input_path, output_path)
-
-        # Step 2: Convert all enhanced PDF pages to images
-        all_slides = []
-        enhanced_pdfs = sorted([f for f in os.listdir(temp_enhanced_dir) if f.endswith('.pdf')])
-
-        print("\nConverting enhanced PDFs to slides...")
-        for enhanced_pdf in tqdm(enhanced_pdfs, desc="Converting PDFs"):
-            pdf_path = os.path.join(temp_enhanced_dir, enhanced_pdf)
-            all_slides.extend(convert_from_path(
-                pdf_path, 
-                dpi=300, 
-                fmt='jpeg',
-                poppler_path=poppler_path
-            ))
-
-        # Step 3: Merge slides into 3 per page
-        temp_merged_path = os.path.join(output_dir, "temp_merged.pdf")
-        print("\nMerging slides into 3 per page...")
-        process_slides_to_pdf(all_slides, temp_merged_path)
-
-        # Step 4: Add page numbers
-        final_output_path = os.path.join(output_dir, f"{base_name}.pdf")
-        print("\nAdding page numbers...")
-        add_page_numbers(temp_merged_path, final_output_path, position, start_page)
-
-        # Cleanup
-        for f in os.listdir(temp_enhanced_dir):
-            os.remove(os.path.join(temp_enhanced_dir, f))
-        os.rmdir(temp_enhanced_dir)
-        os.remove(temp_merged_path)
-
-        print(f"\nProcessing complete! Final output saved to: {final_output_path}")
-
-    elif choice == '2':
-        input_folder = input("Enter path to folder containing PDFs: ").strip()
-        output_folder = input("Enter output directory path: ").strip()
-        base_name = input("Enter base name for output files: ").strip()
-        combine = input("Combine enhanced PDFs into one? (yes/no): ").lower() == 'yes'
-        os.makedirs(output_folder, exist_ok=True)
-
-        pdf_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.pdf')]
-        if not pdf_files:
-            print("No PDFs found.")
-            return
-
-        if combine:
-            merger = PdfMerger()
-            temp_folder = os.path.join(output_folder, "temp_enhanced")
-            os.makedirs(temp_folder, exist_ok=True)
-
-            for pdf_file in tqdm(pdf_files, desc="Enhancing PDFs"):
-                input_path = os.path.join(input_folder, pdf_file)
-                temp_output = os.path.join(temp_folder, f"enhanced_{pdf_file}")
-                enhance_pdf(input_path, temp_output)
-                merger.append(temp_output)
-
-            final_output = os.path.join(output_folder, f"{base_name}_combined.pdf")
-            merger.write(final_output)
-            merger.close()
-            print(f"Combined enhanced PDF saved to {final_output}")
-            # Cleanup
-            for f in os.listdir(temp_folder):
-                os.remove(os.path.join(temp_folder, f))
-            os.rmdir(temp_folder)
-        else:
-            for pdf_file in tqdm(pdf_files, desc="Enhancing PDFs"):
-                input_path = os.path.join(input_folder, pdf_file)
-                output_path = os.path.join(output_folder, f"enhanced_{pdf_file}")
-                enhance_pdf(input_path, output_path)
-            print(f"Enhanced PDFs saved to {output_folder}")
-
-    elif choice == '3':
-        input_path = input("Enter path to PDF file or folder: ").strip()
-        output_folder = input("Enter output directory path: ").strip()
-        output_name = input("Enter output filename (without extension): ").strip() + ".pdf"
-        output_path = os.path.join(output_folder, output_name)
-        poppler_path = get_poppler_path()
-        os.makedirs(output_folder, exist_ok=True)
-
-        if os.path.isdir(input_path):
-            pdf_files = [os.path.join(input_path, f) for f in os.listdir(input_path) if f.endswith('.pdf')]
-        else:
-            pdf_files = [input_path]
-
-        all_slides = []
-        for pdf_file in pdf_files:
-            all_slides.extend(convert_from_path(
-                pdf_file, 
-                dpi=300, 
-                fmt='jpeg',
-                poppler_path=poppler_path
-            ))
-
-        process_slides_to_pdf(all_slides, output_path)
-        print(f"Merged slides PDF saved to {output_path}")
-
-    elif choice == '4':
-        input_pdf = input("Enter path to PDF file: ").strip()
-        output_pdf = input("Enter output PDF path: ").strip()
-        position = input("Page number position (bottom left, etc.): ").strip().lower()
-        start_page = int(input("Starting page number: ").strip())
-
-        add_page_numbers(input_pdf, output_pdf, position, start_page)
-        print(f"Page numbers added. Saved to {output_pdf}")
-
-    elif choice == '5':
-        image_folder = input("Enter path to image folder: ").strip()
-        output_pdf = input("Enter output PDF path: ").strip()
-        position = input("Page number position (bottom left, etc.): ").strip().lower()
-        start_page = int(input("Starting page number: ").strip())
-        dpi = 300
-
-        images = sorted([f for f in os.listdir(image_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
-        if not images:
-            print("No images found.")
-            return
-
-        # Create temporary PDF
-        temp_pdf = os.path.join(os.path.dirname(output_pdf), "temp_no_numbers.pdf")
-        with open(temp_pdf, "wb") as f:
-            images_bytes = []
-            for img_file in images:
-                img_path = os.path.join(image_folder, img_file)
-                img = Image.open(img_path)
-                img = img.convert('RGB')
-                buf = BytesIO()
-                img.save(buf, format='JPEG', dpi=(dpi, dpi))
-                images_bytes.append(buf.getvalue())
-            pdf_bytes = img2pdf.convert(images_bytes)
-            f.write(pdf_bytes)
-
-        # Add page numbers
-        add_page_numbers(temp_pdf, output_pdf, position, start_page)
-        os.remove(temp_pdf)
-        print(f"PDF with page numbers saved to {output_pdf}")
-
-    else:
-        print("Invalid choice.")
-
-if __name__ == "__main__":
-    main()import os
-import fitz
-import gc
-import img2pdf
-from PIL import Image, ImageOps, ImageFilter, ImageEnhance
-from io import BytesIO
-from PyPDF2 import PdfWriter, PdfMerger, PdfReader
-from pdf2image import convert_from_path
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from tqdm import tqdm
-
-# ---------- Enhanced PDF Functions ----------
-def process_image(img, contrast=2.0, sharpness=200):
-    """Simple pipeline: Invert colors → Boost contrast → Sharpen"""
+def process_pixels(pixels, contrast=2.0, sharpness=200):
+    """process_image() for an (h, w, 3) uint8 array, filtered without copying it (needs numba)"""
     try:
-        inverted = ImageOps.invert(img.convert("RGB"))
-        enhancer = ImageEnhance.Contrast(inverted)
-        contrasted = enhancer.enhance(contrast)
-        sharpened = contrasted.filter(ImageFilter.UnsharpMask(
-            radius=1.5, 
-            percent=sharpness, 
-            threshold=2
-        ))
-        return sharpened
+        height, width, _ = pixels.shape
+        # Row sums then column sums stay contiguous reductions; a column of 255s fits uint32
+        channel_sums = pixels.sum(axis=0, dtype="uint32").sum(axis=0, dtype="uint64")
+        lut = _contrast_lut(channel_sums / (height * width), contrast)
+        return _fused_filter(pixels, lut, radius=1.5, percent=sharpness, threshold=2)
     except Exception as e:
         print(f"Image error: {str(e)}")
         return None
-    finally:
-        gc.collect()
 
-def enhance_pdf(input_path, output_path, dpi=300):
-    """PDF processing with minimal filters"""
+def _render_page(args):
+    """Render and filter a single page, returned as JPEG or PNG bytes (runs in a worker process)"""
+    import fitz
+    from PIL import Image
+
+    input_path, page_num, dpi, lossless = args
+    # Document handles can't be pickled, so every worker opens its own
     doc = fitz.open(input_path)
-    writer = PdfWriter()
-    
-    for page_num in range(len(doc)):
-        try:
-            pix = doc[page_num].get_pixmap(dpi=dpi)
+    try:
+        page = doc[page_num]
+        if dpi is None:
+            dpi = slide_render_dpi(page.rect.width, page.rect.height)
+        pix = page.get_pixmap(dpi=dpi)
+        if _load_fused_filter() is not None:
+            import numpy as np
+
+            # The numba filter reads the pixmap's memory in place; pix outlives it (released in finally)
+            pixels = np.frombuffer(pix.samples_mv, np.uint8).reshape(pix.height, pix.width, pix.n)
+            processed = process_pixels(pixels)
+        else:
             img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
             processed = process_image(img)
-            if not processed:
-                continue
-                
-            with BytesIO() as buffer:
+        if not processed:
+            return None
+
+        # JPEG encodes several times faster than PNG's zlib, but text pages come out about
+        # 5x larger; lossless keeps the exact (and for text, smaller) PNG
+        with BytesIO() as buffer:
+            if lossless:
                 processed.save(buffer, format="PNG", dpi=(dpi, dpi))
-                pdf_bytes = img2pdf.convert(
-                    buffer.getvalue(),
-                    layout_fun=img2pdf.get_fixed_dpi_layout_fun((dpi, dpi)),
-                    width=img2pdf.mm_to_pt(processed.width/dpi*25.4),
-                    height=img2pdf.mm_to_pt(processed.height/dpi*25.4)
-                )
-                writer.append(BytesIO(pdf_bytes))
-        except Exception as e:
-            print(f"Page {page_num+1} error: {str(e)}")
-            continue
-        finally:
-            if 'pix' in locals(): del pix
-            if 'img' in locals(): del img
-            if 'processed' in locals(): del processed
-            if page_num % 10 == 0:
-                gc.collect()
-    
-    with open(output_path, "wb") as f:
-        writer.write(f)
-    doc.close()
+            else:
+                processed.save(buffer, format="JPEG", quality=92, dpi=(dpi, dpi))
+            return buffer.getvalue()
+    except Exception as e:
+        print(f"Page {page_num+1} error: {str(e)}")
+        return None
+    finally:
+        if 'pixels' in locals(): del pixels
+        if 'pix' in locals(): del pix
+        if 'img' in locals(): del img
+        if 'processed' in locals(): del processed
+        doc.close()
+
+def usable_cpus():
+    """CPUs this process may run on (taskset, cpusets), falling back to os.cpu_count()"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # sched_getaffinity is Linux-only
+        return os.cpu_count() or 1
+
+def _limit_numba_threads(threads):
+    """Pool initializer: split the cores between workers instead of every worker
+    starting a full set of numba threads for the fused filter's parallel loops"""
+    try:
+        import numba
+    except ImportError:
+        return
+    # set_num_threads rejects anything above NUMBA_NUM_THREADS (affinity size or user override)
+    numba.set_num_threads(max(1, min(threads, numba.config.NUMBA_NUM_THREADS)))
+
+def _worker_pool(max_workers):
+    """Process pool whose workers share usable_cpus() numba threads between them"""
+    threads = max(1, usable_cpus() // max_workers)
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_limit_numba_threads, initargs=(threads,))
+
+def page_pool():
+    """Process pool for rendering pages; create one and share it across files"""
+    return _worker_pool(usable_cpus())
+
+def _enhanced_images(input_path, dpi, executor=None, lossless=False):
+    """Yield every enhanced page as JPEG (PNG if lossless) bytes in page order (in-process without an executor)"""
+    import fitz
+
+    with fitz.open(input_path) as doc:
+        page_count = len(doc)
+
+    jobs = [(input_path, page_num, dpi, lossless) for page_num in range(page_count)]
+    results = executor.map(_render_page, jobs, chunksize=4) if executor else map(_render_page, jobs)
+    for image_bytes in results:
+        if image_bytes:
+            yield image_bytes
+
+def enhance_pdf_pages(input_path, dpi=None, executor=None):
+    """Yield enhanced pages as PIL images without writing an intermediate PDF
+
+    dpi=None renders each page only as finely as its slot on a merged A4 sheet needs.
+    Pass a page_pool() executor to render the pages in parallel.
+    """
+    from PIL import Image
+
+    for jpeg_bytes in _enhanced_images(input_path, dpi, executor):
+        yield Image.open(BytesIO(jpeg_bytes))
+
+def enhance_pdf(input_path, output_path, dpi=300, executor=None, lossless=False):
+    """PDF processing with minimal filters, pages rendered in parallel when given a page_pool()
+
+    Pages are embedded as JPEG unless lossless, which keeps PNG: slower, but exact and
+    several times smaller for text and slide pages.
+    """
+    import fitz
+    import img2pdf
+
+    out = fitz.open()
+    for image_bytes in _enhanced_images(input_path, dpi, executor, lossless):
+        pdf_bytes = img2pdf.convert(
+            image_bytes,
+            layout_fun=img2pdf.get_fixed_dpi_layout_fun((dpi, dpi))
+        )
+        with fitz.open("pdf", pdf_bytes) as page_doc:
+            out.insert_pdf(page_doc)
+
+    # fitz can't save a document with no pages; report the file rather than abort a batch
+    if not out.page_count:
+        print(f"No pages could be enhanced in {input_path}, skipping it")
+        out.close()
+        return
+
+    out.save(output_path, deflate=True, garbage=4)
+    out.close()
+
+def _enhance_one(args):
+    """Enhance one whole file with its pages rendered sequentially (runs in a worker process)"""
+    input_path, output_path, dpi, lossless = args
+    enhance_pdf(input_path, output_path, dpi, lossless=lossless)
+
+def enhance_pdfs(jobs, desc="Enhancing PDFs", lossless=False):
+    """Enhance (input_path, output_path, dpi) jobs, one file per worker process"""
+    from tqdm import tqdm
+
+    if len(jobs) == 1:
+        # A lone file gets more out of spreading its pages across the cores
+        with page_pool() as executor:
+            enhance_pdf(*jobs[0], executor=executor, lossless=lossless)
+        return
+
+    with _worker_pool(min(len(jobs), usable_cpus())) as executor:
+        file_jobs = [job + (lossless,) for job in jobs]
+        for _ in tqdm(executor.map(_enhance_one, file_jobs), total=len(jobs), desc=desc):
+            pass
 
 # ---------- Merge Slides Functions ----------
+A4_WIDTH, A4_HEIGHT = 2480, 3508  # 8.27" x 11.69" @300DPI
+SLIDES_PER_PAGE = 3
+
+def slide_render_dpi(page_width, page_height, max_dpi=300):
+    """Lowest DPI at which a page (size in points) still fills its slot on a merged A4 sheet"""
+    slot_dpi = min(A4_WIDTH / (page_width / 72), (A4_HEIGHT // SLIDES_PER_PAGE) / (page_height / 72))
+    return min(max_dpi, math.ceil(slot_dpi))
+
+def pdf_to_pil_pages(path, dpi=None):
+    """Rasterize each PDF page to a PIL image in-process with PyMuPDF (dpi=None fits the A4 slot)"""
+    import fitz
+    from PIL import Image
+
+    with fitz.open(path) as doc:
+        for page in doc:
+            page_dpi = dpi or slide_render_dpi(page.rect.width, page.rect.height)
+            pix = page.get_pixmap(dpi=page_dpi)
+            yield Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
 def process_slides_to_pdf(slides, output_path, dpi=300):
-    A4_WIDTH, A4_HEIGHT = 2480, 3508  # 8.27" x 11.69" @300DPI
-    SLIDES_PER_PAGE = 3
-    output_pages = []
+    import img2pdf
+    from PIL import Image
 
-    for i in range(0, len(slides), SLIDES_PER_PAGE):
+    slides = iter(slides)
+
+    # Finished sheets go straight to disk as JPEGs, so only one is held in memory at a time
+    with tempfile.TemporaryDirectory() as temp_dir:
+        page_paths = []
+        # One sheet is reused for every page; it is encoded to disk before being wiped
         page = Image.new('RGB', (A4_WIDTH, A4_HEIGHT), (255, 255, 255))
-        y_cursor = 0
-        
-        for slide in slides[i:i+SLIDES_PER_PAGE]:
-            if slide.mode == 'RGBA':
-                slide = slide.convert('RGB')
-            
-            orig_width, orig_height = slide.size
-            target_height = A4_HEIGHT // SLIDES_PER_PAGE
-            
-            scale_factor = target_height / orig_height
-            scaled_width = int(orig_width * scale_factor)
-            
-            if scaled_width > A4_WIDTH:
-                scale_factor = A4_WIDTH / orig_width
-                scaled_width = A4_WIDTH
-                target_height = int(orig_height * scale_factor)
+        while True:
+            group = list(islice(slides, SLIDES_PER_PAGE))
+            if not group:
+                break
+
+            page.paste((255, 255, 255), (0, 0, A4_WIDTH, A4_HEIGHT))
+            y_cursor = 0
             
-            resized = slide.resize((scaled_width, target_height), Image.LANCZOS)
-            x_pos = (A4_WIDTH - scaled_width) // 2
-            page.paste(resized, (x_pos, y_cursor))
-            y_cursor += target_height
-        
-        output_pages.append(page)
-
-    with open(output_path, "wb") as f:
-        images_bytes = []
-        for img in output_pages:
-            img_byte_arr = BytesIO()
-            img.save(img_byte_arr, format='JPEG', quality=95, dpi=(dpi, dpi))
-            images_bytes.append(img_byte_arr.getvalue())
-        
-        pdf_bytes = img2pdf.convert(images_bytes, layout_fun=img2pdf.get_layout_fun(
-            (img2pdf.in_to_pt(8.27), img2pdf.in_to_pt(11.69))
-        ))
-        f.write(pdf_bytes)
+            for slide in group:
+                if slide.mode == 'RGBA':
+                    slide = slide.convert('RGB')
+                
+                orig_width, orig_height = slide.size
+                target_height = A4_HEIGHT // SLIDES_PER_PAGE
+                
+                scale_factor = target_height / orig_height
+                scaled_width = int(orig_width * scale_factor)
+                
+                if scaled_width > A4_WIDTH:
+                    scale_factor = A4_WIDTH / orig_width
+                    scaled_width = A4_WIDTH
+                    target_height = int(orig_height * scale_factor)
+                
+                # Cheap integer box reduction first, so LANCZOS only handles the last <2x step
+                factor = max(1, min(orig_width // scaled_width, orig_height // target_height))
+                reduced = slide.reduce(factor) if factor > 1 else slide
+                resized = reduced.resize((scaled_width, target_height), Image.LANCZOS)
+                x_pos = (A4_WIDTH - scaled_width) // 2
+                page.paste(resized, (x_pos, y_cursor))
+                y_cursor += target_height
+
+            page_path = os.path.join(temp_dir, f"{len(page_paths):05d}.jpg")
+            page.save(page_path, format='JPEG', quality=95, dpi=(dpi, dpi))
+            page_paths.append(page_path)
+
+        with open(output_path, "wb") as f:
+            img2pdf.convert(page_paths, layout_fun=img2pdf.get_layout_fun(
+                (img2pdf.in_to_pt(8.27), img2pdf.in_to_pt(11.69))
+            ), outputstream=f)
 
 # ---------- Page Number Functions ----------
+# position -> (x anchor as a fraction of page width, x offset, y anchor fraction, y offset)
+_PAGE_NUMBER_POSITIONS = {
+    "bottom left": (0, 10, 0, 10),
+    "bottom right": (1, -30, 0, 10),
+    "top left": (0, 10, 1, -20),
+    "top right": (1, -30, 1, -20),
+    "top middle": (0.5, -10, 1, -20),
+    "bottom middle": (0.5, -10, 0, 10)
+}
+_DEFAULT_PAGE_NUMBER_POSITION = _PAGE_NUMBER_POSITIONS["bottom left"]
+
 def get_page_number_position(position, page_width, page_height):
-    positions = {
-        "bottom left": (10, 10),
-        "bottom right": (page_width - 30, 10),
-        "top left": (10, page_height - 20),
-        "top right": (page_width - 30, page_height - 20),
-        "top middle": (page_width / 2 - 10, page_height - 20),
-        "bottom middle": (page_width / 2 - 10, 10)
-    }
-    return positions.get(position, (10, 10))
-
-def create_page_number_pdf(page_num, position, page_width, page_height):
+    x_anchor, x_offset, y_anchor, y_offset = _PAGE_NUMBER_POSITIONS.get(position, _DEFAULT_PAGE_NUMBER_POSITION)
+    return page_width * x_anchor + x_offset, page_height * y_anchor + y_offset
+
+def create_page_number_pdf(reader, position, start_page):
+    """Draw every page number into one multi-page overlay, page i matching reader page i"""
+    from pypdf import PdfReader
+    from reportlab.pdfgen import canvas
+
     packet = BytesIO()
-    can = canvas.Canvas(packet, pagesize=(page_width, page_height))
-    x, y = get_page_number_position(position, page_width, page_height)
-    can.setFont("Helvetica", 12)
-    can.drawString(x, y, str(page_num))
+    can = canvas.Canvas(packet)
+    for i, page in enumerate(reader.pages):
+        page_width = float(page.mediabox[2])
+        page_height = float(page.mediabox[3])
+        can.setPageSize((page_width, page_height))
+        x, y = get_page_number_position(position, page_width, page_height)
+        can.setFont("Helvetica", 12)
+        can.drawString(x, y, str(start_page + i))
+        can.showPage()
     can.save()
     packet.seek(0)
-    return packet
+    return PdfReader(packet)
 
 def add_page_numbers(input_pdf_path, output_pdf_path, position, start_page=1):
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import NameObject
+
     reader = PdfReader(input_pdf_path)
     writer = PdfWriter()
-
-    for i in range(len(reader.pages)):
-        page = reader.pages[i]
-        page_width = float(page.mediabox[2])
-        page_height = float(page.mediabox[3])
-        
-        temp_pdf = create_page_number_pdf(start_page + i, position, page_width, page_height)
-        page_number_reader = PdfReader(temp_pdf)
-        page.merge_page(page_number_reader.pages[0])
-        writer.add_page(page)
+    overlay = create_page_number_pdf(reader, position, start_page)
+
+    for page, number_page in zip(reader.pages, overlay.pages):
+        page = writer.add_page(page)
+        # Pages can share one /Contents stream (fitz's garbage=4 dedupes identical ones) and
+        # merge_page rewrites it in place, so give each page its own copy before merging
+        contents = page.get_contents()
+        if contents is not None:
+            del page[NameObject("/Contents")]
+            page.replace_contents(contents)
+        page.merge_page(number_page)
 
     with open(output_pdf_path, "wb") as f:
         writer.write(f)
 
 # ---------- Main Workflow ----------
-def get_poppler_path():
-    """Helper function to get Poppler path from user"""
-    return input("Enter path to Poppler's bin directory (e.g., C:\\poppler\\Library\\bin): ").strip()
+def _enhanced_slides(pdf_files, executor):
+    """Enhanced pages of every file in turn; the progress bar ticks once a file's pages are used up"""
+    from tqdm import tqdm
+
+    with tqdm(total=len(pdf_files), desc="Processing PDFs") as progress:
+        for pdf_file in pdf_files:
+            yield from enhance_pdf_pages(pdf_file.path, executor=executor)
+            progress.update()
+
+def list_files(folder, extensions):
+    """Files in folder ending with one of extensions (case-insensitive), as DirEntries sorted by name"""
+    with os.scandir(folder) as entries:
+        return sorted(
+            (entry for entry in entries if entry.is_file() and entry.name.lower().endswith(extensions)),
+            key=lambda entry: entry.name
+        )
 
 def main():
     print("=== PDF Processing Tool ===")
@@ -498,53 +471,30 @@ def main():
         base_name = input("Enter base name for output file (without extension): ").strip()
         position = input("Page number position (bottom left, bottom right, top left, top right, top middle, bottom middle): ").strip().lower()
         start_page = int(input("Starting page number: ").strip())
-        poppler_path = get_poppler_path()
 
         os.makedirs(output_dir, exist_ok=True)
 
-        # Step 1: Enhance all PDFs
-        temp_enhanced_dir = os.path.join(output_dir, "temp_enhanced_pdfs")
-        os.makedirs(temp_enhanced_dir, exist_ok=True)
-
-        pdf_files = sorted([f for f in os.listdir(input_folder) if f.lower().endswith('.pdf')])
+        pdf_files = list_files(input_folder, '.pdf')
         if not pdf_files:
             print("No PDF files found in the input folder.")
             return
 
-        print("\nEnhancing PDFs...")
-        for pdf_file in tqdm(pdf_files, desc="Processing PDFs"):
-            input_path = os.path.join(input_folder, pdf_file)
-            output_path = os.path.join(temp_enhanced_dir, f"enhanced_{pdf_file}")
-            enhance_pdf(input_path, output_path)
-
-        # Step 2: Convert all enhanced PDF pages to images
-        all_slides = []
-        enhanced_pdfs = sorted([f for f in os.listdir(temp_enhanced_dir) if f.endswith('.pdf')])
-
-        print("\nConverting enhanced PDFs to slides...")
-        for enhanced_pdf in tqdm(enhanced_pdfs, desc="Converting PDFs"):
-            pdf_path = os.path.join(temp_enhanced_dir, enhanced_pdf)
-            all_slides.extend(convert_from_path(
-                pdf_path, 
-                dpi=300, 
-                fmt='jpeg',
-                poppler_path=poppler_path
-            ))
-
-        # Step 3: Merge slides into 3 per page
         temp_merged_path = os.path.join(output_dir, "temp_merged.pdf")
-        print("\nMerging slides into 3 per page...")
-        process_slides_to_pdf(all_slides, temp_merged_path)
+        print("\nEnhancing PDFs and merging slides into 3 per page...")
+        # One pool for every file, so worker start-up isn't paid per PDF
+        with page_pool() as executor:
+            # Step 1: Enhance all PDFs straight into slide images (lazily, page by page)
+            all_slides = _enhanced_slides(pdf_files, executor)
 
-        # Step 4: Add page numbers
+            # Step 2: Merge slides into 3 per page as they are enhanced
+            process_slides_to_pdf(all_slides, temp_merged_path)
+
+        # Step 3: Add page numbers
         final_output_path = os.path.join(output_dir, f"{base_name}.pdf")
         print("\nAdding page numbers...")
         add_page_numbers(temp_merged_path, final_output_path, position, start_page)
 
         # Cleanup
-        for f in os.listdir(temp_enhanced_dir):
-            os.remove(os.path.join(temp_enhanced_dir, f))
-        os.rmdir(temp_enhanced_dir)
         os.remove(temp_merged_path)
 
         print(f"\nProcessing complete! Final output saved to: {final_output_path}")
@@ -554,37 +504,45 @@ def main():
         output_folder = input("Enter output directory path: ").strip()
         base_name = input("Enter base name for output files: ").strip()
         combine = input("Combine enhanced PDFs into one? (yes/no): ").lower() == 'yes'
+        lossless = input("Keep pages lossless (PNG: slower, but smaller for text)? (yes/no): ").lower() == 'yes'
         os.makedirs(output_folder, exist_ok=True)
 
-        pdf_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.pdf')]
+        pdf_files = list_files(input_folder, '.pdf')
         if not pdf_files:
             print("No PDFs found.")
             return
 
         if combine:
-            merger = PdfMerger()
+            import fitz
+
+            combined = fitz.open()
             temp_folder = os.path.join(output_folder, "temp_enhanced")
             os.makedirs(temp_folder, exist_ok=True)
 
-            for pdf_file in tqdm(pdf_files, desc="Enhancing PDFs"):
-                input_path = os.path.join(input_folder, pdf_file)
-                temp_output = os.path.join(temp_folder, f"enhanced_{pdf_file}")
-                enhance_pdf(input_path, temp_output)
-                merger.append(temp_output)
-
-            final_output = os.path.join(output_folder, f"{base_name}_combined.pdf")
-            merger.write(final_output)
-            merger.close()
-            print(f"Combined enhanced PDF saved to {final_output}")
+            jobs = [(pdf_file.path, os.path.join(temp_folder, f"enhanced_{pdf_file.name}"), 300)
+                    for pdf_file in pdf_files]
+            enhance_pdfs(jobs, lossless=lossless)
+            # Files with no enhanceable pages were skipped and have no temp output
+            temp_outputs = [temp_output for _, temp_output, _ in jobs if os.path.exists(temp_output)]
+            for temp_output in temp_outputs:
+                with fitz.open(temp_output) as src:
+                    combined.insert_pdf(src)
+
+            if combined.page_count:
+                final_output = os.path.join(output_folder, f"{base_name}_combined.pdf")
+                combined.save(final_output, deflate=True, garbage=4, clean=True)
+                print(f"Combined enhanced PDF saved to {final_output}")
+            else:
+                print("No pages could be enhanced.")
+            combined.close()
             # Cleanup
-            for f in os.listdir(temp_folder):
-                os.remove(os.path.join(temp_folder, f))
+            for temp_output in temp_outputs:
+                os.remove(temp_output)
             os.rmdir(temp_folder)
         else:
-            for pdf_file in tqdm(pdf_files, desc="Enhancing PDFs"):
-                input_path = os.path.join(input_folder, pdf_file)
-                output_path = os.path.join(output_folder, f"enhanced_{pdf_file}")
-                enhance_pdf(input_path, output_path)
+            jobs = [(pdf_file.path, os.path.join(output_folder, f"enhanced_{pdf_file.name}"), 300)
+                    for pdf_file in pdf_files]
+            enhance_pdfs(jobs, lossless=lossless)
             print(f"Enhanced PDFs saved to {output_folder}")
 
     elif choice == '3':
@@ -592,23 +550,14 @@ def main():
         output_folder = input("Enter output directory path: ").strip()
         output_name = input("Enter output filename (without extension): ").strip() + ".pdf"
         output_path = os.path.join(output_folder, output_name)
-        poppler_path = get_poppler_path()
         os.makedirs(output_folder, exist_ok=True)
 
         if os.path.isdir(input_path):
-            pdf_files = [os.path.join(input_path, f) for f in os.listdir(input_path) if f.endswith('.pdf')]
+            pdf_files = [entry.path for entry in list_files(input_path, '.pdf')]
         else:
             pdf_files = [input_path]
 
-        all_slides = []
-        for pdf_file in pdf_files:
-            all_slides.extend(convert_from_path(
-                pdf_file, 
-                dpi=300, 
-                fmt='jpeg',
-                poppler_path=poppler_path
-            ))
-
+        all_slides = chain.from_iterable(pdf_to_pil_pages(pdf_file) for pdf_file in pdf_files)
         process_slides_to_pdf(all_slides, output_path)
         print(f"Merged slides PDF saved to {output_path}")
 
@@ -628,18 +577,20 @@ def main():
         start_page = int(input("Starting page number: ").strip())
         dpi = 300
 
-        images = sorted([f for f in os.listdir(image_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
+        images = list_files(image_folder, ('.png', '.jpg', '.jpeg'))
         if not images:
             print("No images found.")
             return
 
+        import img2pdf
+        from PIL import Image
+
         # Create temporary PDF
         temp_pdf = os.path.join(os.path.dirname(output_pdf), "temp_no_numbers.pdf")
         with open(temp_pdf, "wb") as f:
             images_bytes = []
             for img_file in images:
-                img_path = os.path.join(image_folder, img_file)
-                img = Image.open(img_path)
+                img = Image.open(img_file.path)
                 img = img.convert('RGB')
                 buf = BytesIO()
                 img.save(buf, format='JPEG', dpi=(dpi, dpi))
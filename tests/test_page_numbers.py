@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+from pypdf import PdfReader
+
+from main import add_page_numbers
+
+
+class AddPageNumbersTest(unittest.TestCase):
+    def test_pages_sharing_one_content_stream(self):
+        """Enhanced PDFs are saved with garbage=4, which dedupes identical page streams"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = os.path.join(temp_dir, "shared.pdf")
+            output_path = os.path.join(temp_dir, "numbered.pdf")
+
+            doc = fitz.open()
+            for _ in range(5):
+                doc.new_page().insert_text((72, 72), "slide")
+            doc.save(input_path, garbage=4, deflate=True)
+            doc.close()
+            contents = {str(page.get("/Contents")) for page in PdfReader(input_path).pages}
+            self.assertEqual(len(contents), 1)
+
+            add_page_numbers(input_path, output_path, "bottom left", 1)
+
+            texts = [page.extract_text().split() for page in PdfReader(output_path).pages]
+            self.assertEqual(texts, [["slide", str(n)] for n in range(1, 6)])
+
+
+if __name__ == "__main__":
+    unittest.main()